@@ -0,0 +1,210 @@
+// ── Cluster mode entry point ───────────────────────────────────────────────
+// Runs CLUSTER_WORKERS copies of server.js, each on its own internal port,
+// and a small HTTP router on PORT that sends every request for a room to the
+// worker that owns it (consistent hashing on the room code).
+//
+// The primary also acts as the local store for state the workers share:
+//   - a FIFO lock, used for the signer's transaction queue (nonces)
+//   - replicated maps, used for the league registry and lobby cache
+//
+// Room state lives in worker memory. If a worker dies its slot leaves the
+// ring and its rooms fall to the next owner, which rebuilds each one from the
+// chain snapshot on first request; a replacement is then forked into the same
+// slot and the rooms move back the same way. Only what's on chain survives a
+// move — in-flight steals, recent events and pending auto-miss timers are lost.
+// The router holds traffic until every worker has started, so rooms aren't
+// created against a partial ring.
+//
+// Usage: CLUSTER_WORKERS=4 node cluster.js
+import "dotenv/config";
+import cluster from "node:cluster";
+import http from "node:http";
+import os from "node:os";
+import { HashRing } from "./shard.js";
+
+const PORT      = Number(process.env.PORT || 3000);
+const BASE_PORT = Number(process.env.WORKER_BASE_PORT || PORT + 1);
+const WORKERS   = Number(process.env.CLUSTER_WORKERS || os.cpus().length);
+
+cluster.setupPrimary({ exec: "server.js" });
+
+const ring    = new HashRing();
+const workers = new Map();   // slot → Worker (listening only)
+let shuttingDown = false;
+let ready        = false;   // every initial worker has started listening
+
+// ── Local store: locks ─────────────────────────────────────────────────────
+const locks = new Map();   // name → { holder: { slot, id } | null, queue: [{ slot, id }] }
+
+function grantNext(name) {
+  const lock = locks.get(name);
+  while (!lock.holder && lock.queue.length) {
+    const next   = lock.queue.shift();
+    const worker = workers.get(next.slot) || slotWorker(next.slot);
+    if (!worker) continue;   // requester died while queued
+    lock.holder = next;
+    worker.send({ type: "lock_granted", id: next.id });
+  }
+}
+
+function releaseLocksOf(slot) {
+  for (const [name, lock] of locks) {
+    lock.queue = lock.queue.filter(r => r.slot !== slot);
+    if (lock.holder?.slot === slot) {
+      lock.holder = null;
+      grantNext(name);
+    }
+  }
+}
+
+// ── Local store: replicated maps ───────────────────────────────────────────
+const maps = new Map();   // name → Map (master copy)
+
+function storeMap(name) {
+  if (!maps.has(name)) maps.set(name, new Map());
+  return maps.get(name);
+}
+
+function broadcast(msg, exceptSlot = null) {
+  for (const worker of Object.values(cluster.workers)) {
+    if (worker.slot !== exceptSlot && worker.isConnected()) worker.send(msg);
+  }
+}
+
+// ── Worker lifecycle ───────────────────────────────────────────────────────
+function slotWorker(slot) {
+  return Object.values(cluster.workers).find(w => w.slot === slot && w.isConnected()) || null;
+}
+
+function publishRing() {
+  broadcast({ type: "ring", members: [...ring.members] });
+}
+
+function forkSlot(slot) {
+  const worker = cluster.fork({ WORKER_SLOT: String(slot), PORT: String(BASE_PORT + slot) });
+  worker.slot  = slot;
+
+  worker.on("listening", () => {
+    workers.set(slot, worker);
+    ring.add(slot);
+    publishRing();
+    if (!ready && workers.size === WORKERS) {
+      ready = true;
+      console.log(`[cluster] All ${WORKERS} workers up — accepting traffic`);
+    }
+    console.log(`[cluster] Worker slot ${slot} (pid ${worker.process.pid}) listening on ${BASE_PORT + slot}`);
+  });
+
+  worker.on("message", msg => {
+    if (msg.type === "hello") {
+      // Seed the new worker with current shared state before it serves traffic
+      for (const [name, map] of maps) {
+        worker.send({ type: "map_snapshot", name, entries: [...map] });
+      }
+      worker.send({ type: "ring", members: [...ring.members] });
+    } else if (msg.type === "lock") {
+      if (!locks.has(msg.name)) locks.set(msg.name, { holder: null, queue: [] });
+      locks.get(msg.name).queue.push({ slot, id: msg.id });
+      grantNext(msg.name);
+    } else if (msg.type === "unlock") {
+      const lock = locks.get(msg.name);
+      if (lock?.holder?.id === msg.id) {
+        lock.holder = null;
+        grantNext(msg.name);
+      }
+    } else if (msg.type === "map_set") {
+      storeMap(msg.name).set(msg.key, msg.value);
+      broadcast(msg, slot);
+    } else if (msg.type === "map_delete") {
+      storeMap(msg.name).delete(msg.key);
+      broadcast(msg, slot);
+    } else if (msg.type === "map_clear") {
+      storeMap(msg.name).clear();
+      broadcast(msg, slot);
+    }
+  });
+
+  worker.on("exit", (code, signal) => {
+    if (workers.get(slot) === worker) workers.delete(slot);
+    ring.remove(slot);
+    publishRing();
+    releaseLocksOf(slot);
+    if (shuttingDown) return;
+    console.warn(`[cluster] Worker slot ${slot} exited (${signal || code}) — its rooms are rebuilt elsewhere until it is replaced`);
+    setTimeout(() => forkSlot(slot), 1000);
+  });
+}
+
+// ── Router ─────────────────────────────────────────────────────────────────
+const ROOM_PATH = /^\/api\/(?:poll|spectate|room|bettor)\/([^/?]+)/;
+const JOB_PATH  = /^\/api\/job\/(\d+)-/;
+let rrNext = 0;
+
+function pickSlot(req, body) {
+  const job = JOB_PATH.exec(req.url);
+  if (job && workers.has(Number(job[1]))) return Number(job[1]);
+
+  let room_code = ROOM_PATH.exec(req.url)?.[1] || null;
+  if (!room_code && body.length && (req.headers["content-type"] || "").includes("json")) {
+    try { room_code = JSON.parse(body).room_code || null; } catch {}
+  }
+  if (room_code) return ring.owner(decodeURIComponent(room_code));
+
+  // Room-less requests (lobby, leagues, static files, create-room) go round-robin
+  const live = [...workers.keys()];
+  if (live.length === 0) return null;
+  return live[rrNext++ % live.length];
+}
+
+const router = http.createServer((req, res) => {
+  const chunks = [];
+  req.on("data", c => chunks.push(c));
+  req.on("end", () => {
+    const body = Buffer.concat(chunks);
+    let slot = null;
+    try {
+      if (ready) slot = pickSlot(req, body.toString());
+    } catch (err) {
+      // Malformed %-escape in the room code — answer like Express would
+      // instead of letting the throw take down the primary
+      if (!(err instanceof URIError)) throw err;
+      res.writeHead(400, { "Content-Type": "application/json" });
+      return res.end(JSON.stringify({ error: "Malformed room code" }));
+    }
+    if (slot === null || !workers.has(slot)) {
+      res.writeHead(503, { "Content-Type": "application/json" });
+      return res.end(JSON.stringify({ error: "No worker available — try again shortly" }));
+    }
+
+    const upstream = http.request({
+      host:    "127.0.0.1",
+      port:    BASE_PORT + slot,
+      method:  req.method,
+      path:    req.url,
+      headers: req.headers,
+    }, up => {
+      res.writeHead(up.statusCode, up.headers);
+      up.pipe(res);
+    });
+    upstream.on("error", err => {
+      console.warn(`[cluster] Proxy to slot ${slot} failed: ${err.message}`);
+      if (!res.headersSent) res.writeHead(502, { "Content-Type": "application/json" });
+      res.end(JSON.stringify({ error: "Worker unavailable" }));
+    });
+    upstream.end(body);
+  });
+});
+
+// ── Start ──────────────────────────────────────────────────────────────────
+console.log(`[cluster] Starting ${WORKERS} workers (ports ${BASE_PORT}-${BASE_PORT + WORKERS - 1})`);
+for (let slot = 0; slot < WORKERS; slot++) forkSlot(slot);
+
+router.listen(PORT, () => {
+  console.log(`[cluster] Router running at http://localhost:${PORT}`);
+});
+
+process.on("SIGTERM", () => {
+  shuttingDown = true;
+  router.close();
+  for (const worker of Object.values(cluster.workers)) worker.kill();
+});
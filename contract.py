@@ -24,6 +24,25 @@
 #
 # LEAGUE SYSTEM:
 #   Players create/join weekly leagues, standings tracked on-chain
+#   Leagues are enumerable via list_leagues (append-only league index)
+#   roll_league_season freezes a standings snapshot once a week has passed
+#   and resets the live counters; past seasons are read with get_league_season
+#   Seasons start on fixed weekly boundaries from created_at. A roll after
+#   several idle weeks closes the current season once and jumps straight to
+#   the latest boundary, so there is one snapshot per roll, not per week
+#
+# ROOM INDEX:
+#   Waiting/active rooms are kept in per-status slot lists (swap-remove, O(1))
+#   Every index change gets a sequence number and goes into a ring buffer of
+#   the last ROOM_INDEX_LOG_SIZE changes, so the server can page the lobby
+#   with list_rooms and then follow get_room_changes (re-paging if it falls
+#   out of the window). A room swapped into a freed slot is logged too, so a
+#   replay after paging also covers rooms that moved behind the pager.
+#   Both views return "RI1\n", a header line, then one record per room:
+#     list_rooms header "total"; record = 4 strings
+#     get_room_changes header "last_seq|first_seq"; record = "seq;" + 4 strings
+#   strings are "<utf-8 byte length>:<bytes>" (as in RS1):
+#     room_code,status,anime1,anime2
 #
 # TOKEN MECHANICS:
 #   Answer correctly   → streak +1, no token change
@@ -32,9 +51,35 @@
 #   3 correct streak   → earn next power-up in cycle
 #   5 wrong in a row   → 1 token burned from your balance
 #   Win game           → +5 GOT bonus mint
+#
+# VERDICT CACHE:
+#   submit_answer remembers the last 512 verdicts keyed by
+#   sha256(normalized question, normalized answer), so steals and repeated
+#   answers skip the LLM. Empty answers (the server's auto-miss sends one) are
+#   wrong without a prompt.
+#
+# ROOM SNAPSHOTS (decoded by roomcodec.js on the server):
+#   get_room_snapshot / get_room_snapshots return "RS1\n" followed by one
+#   record per room. A record is 15 comma-separated ints ended by ";"
+#     state,p1_bal,p2_bal,q1,q2,pu1,pu2,snipe1,snipe2,bets_p1,bets_p2,
+#     p1_cstreak,p2_cstreak,p1_wstreak,p2_wstreak
+#   (state/powerups as codes, see ROOM_STATE_CODES / POWERUP_CODES) then 7
+#   strings, each "<utf-8 byte length>:<bytes>"
+#     room_code,p1,p2,anime1,anime2,winner,league_code
+
+import hashlib
 
 from genlayer import *
 
+VERDICT_CACHE_SIZE  = 512
+ROOM_INDEX_LOG_SIZE = 256
+LEAGUE_SEASON_SECS  = 7 * 24 * 60 * 60
+
+ROOM_SNAPSHOT_VERSION = "RS1"
+ROOM_INDEX_VERSION    = "RI1"
+ROOM_STATE_CODES      = {"waiting": 0, "active": 1, "finished": 2}   # -1 = not found
+POWERUP_CODES         = {"": 0, "shield": 1, "snipe": 2, "double_down": 3}
+
 @gl.contract
 class AnimeTrivialDuel:
 
@@ -91,11 +136,32 @@ class AnimeTrivialDuel:
     league_tokens_earned: TreeMap[str, int]   # "code|addr" → net GOT earned (can be negative via 0 floor)
     league_games:         TreeMap[str, int]   # "code|addr" → games played
     room_league:          TreeMap[str, str]   # room_code → league_code (or "")
+    league_index:         TreeMap[str, str]   # str(idx) → league_code (creation order)
+    league_count:         int
+    league_season:        TreeMap[str, int]   # code → current season number (1-based)
+    league_season_start:  TreeMap[str, int]   # code → unix timestamp current season began
+    league_season_snapshot: TreeMap[str, str] # "code|season" → "addr,wins,losses,tokens,games;..."
+
+    # ── Room Index (open + active rooms only) ──────────────────────────────────
+    room_index_slot:   TreeMap[str, str]   # "status|idx" → room_code
+    room_index_count:  TreeMap[str, int]   # status → number of rooms in list
+    room_index_pos:    TreeMap[str, int]   # room_code → idx in its status list
+    room_index_status: TreeMap[str, str]   # room_code → status list it is in
+    room_index_seq:    int                 # last change sequence number
+    room_index_log:    TreeMap[str, str]   # str(seq % ROOM_INDEX_LOG_SIZE) → "room_code|status"
+
+    # ── Verdict Cache (ring buffer of VERDICT_CACHE_SIZE entries) ──────────────
+    verdict_cache:      TreeMap[str, str]  # sha256 key → "correct" | "wrong"
+    verdict_cache_keys: TreeMap[str, str]  # str(slot) → sha256 key stored there
+    verdict_cache_next: int                # next slot to overwrite
 
 
     def __init__(self):
-        self.total_supply = 0
-        self.total_burned = 0
+        self.total_supply   = 0
+        self.total_burned   = 0
+        self.room_index_seq = 0
+        self.league_count   = 0
+        self.verdict_cache_next = 0
 
 
     # ══════════════════════════════════════════════════════════════════════════
@@ -127,6 +193,8 @@ class AnimeTrivialDuel:
         self.room_bets_p2[room_code]           = 0
         self.room_league[room_code]            = league_code.strip()
 
+        self._index_room(room_code, "waiting")
+
 
     @gl.public.write
     def join_room(self, room_code: str, anime: str, player_address: str) -> None:
@@ -141,6 +209,7 @@ class AnimeTrivialDuel:
         self.room_player2[room_code] = player_address
         self.room_anime2[room_code]  = anime.strip()
         self.room_state[room_code]   = "active"
+        self._index_room(room_code, "active")
 
         # Airdrop 20 GOT to each player
         self._mint(p1, 20)
@@ -184,6 +253,7 @@ class AnimeTrivialDuel:
 
         self.room_state[room_code]  = "finished"
         self.room_winner[room_code] = active_player_address
+        self._index_room(room_code, "finished")
 
         return "forfeited:" + active_player_address
 
@@ -330,19 +400,7 @@ class AnimeTrivialDuel:
         is_p2 = (player_address == p2)
         assert is_p1 or is_p2, "Not a player in this room"
 
-        prompt = (
-            f"Anime trivia question: {question}\n"
-            f"Player's answer: {player_answer}\n\n"
-            f"Is the player's answer correct? Be lenient — accept alternate valid answers "
-            f"and minor spelling errors.\n"
-            f"Reply with ONLY the single word 'correct' or 'wrong'."
-        )
-
-        def check():
-            return gl.nondet.exec_prompt(prompt)
-
-        verdict    = gl.eq_principle.strict_eq(check).strip().lower()
-        is_correct = verdict.startswith("correct")
+        is_correct = self._verify_answer(question, player_answer)
 
         # ── STEAL ATTEMPT ──────────────────────────────────────────────────────
         if is_steal:
@@ -463,6 +521,7 @@ class AnimeTrivialDuel:
         p2_bal = self.balances[p2] if p2 in self.balances else 0
 
         self.room_state[room_code] = "finished"
+        self._index_room(room_code, "finished")
 
         if p1_bal > p2_bal:
             winner = p1
@@ -586,6 +645,11 @@ class AnimeTrivialDuel:
         self.league_creator[league_code]      = creator_address
         self.league_created_at[league_code]   = created_at
         self.league_member_count[league_code] = 1
+        self.league_season[league_code]       = 1
+        self.league_season_start[league_code] = created_at
+
+        self.league_index[str(self.league_count)] = league_code
+        self.league_count = self.league_count + 1
 
         # Creator is first member
         idx_key = f"{league_code}|0"
@@ -642,6 +706,41 @@ class AnimeTrivialDuel:
             self.league_tokens_earned[lk] = self.league_tokens_earned[lk] + loser_delta
             self.league_games[lk]         = self.league_games[lk] + 1
 
+    @gl.public.write
+    def roll_league_season(self, league_code: str, now: int) -> int:
+        """
+        Close the current season once 7 days have passed since it began.
+        Freezes every member's wins|losses|tokens|games into one snapshot string,
+        resets the live counters in the same pass and starts the next season on
+        the latest weekly boundary at or before now, so missed weeks fold into
+        the closed season instead of getting empty snapshots of their own.
+        Returns the number of the season that was closed.
+        """
+        assert league_code in self.league_name, "League not found"
+
+        season = self.league_season[league_code]      if league_code in self.league_season      else 1
+        start  = self.league_season_start[league_code] if league_code in self.league_season_start else self.league_created_at[league_code]
+        assert now >= start + LEAGUE_SEASON_SECS, "Season still running"
+
+        rows  = []
+        count = self.league_member_count[league_code]
+        for i in range(count):
+            addr = self.league_members[f"{league_code}|{i}"]
+            key  = f"{league_code}|{addr}"
+            rows.append(f"{addr},{self.league_wins[key]},{self.league_losses[key]},"
+                        f"{self.league_tokens_earned[key]},{self.league_games[key]}")
+            self.league_wins[key]          = 0
+            self.league_losses[key]        = 0
+            self.league_tokens_earned[key] = 0
+            self.league_games[key]         = 0
+
+        next_start = start + (now - start) // LEAGUE_SEASON_SECS * LEAGUE_SEASON_SECS
+
+        self.league_season_snapshot[f"{league_code}|{season}"] = ";".join(rows)
+        self.league_season[league_code]       = season + 1
+        self.league_season_start[league_code] = next_start
+        return season
+
 
     # ══════════════════════════════════════════════════════════════════════════
     # READ FUNCTIONS
@@ -661,7 +760,10 @@ class AnimeTrivialDuel:
 
     @gl.public.view
     def get_room_info(self, room_code: str) -> str:
-        """state|p1|p2|anime1|anime2|p1_bal|p2_bal|q1|q2|pu1|pu2|winner|snipe1|snipe2|bets_p1|bets_p2|p1_cstreak|p2_cstreak|p1_wstreak|p2_wstreak|league_code"""
+        """
+        state|p1|p2|anime1|anime2|p1_bal|p2_bal|q1|q2|pu1|pu2|winner|snipe1|snipe2|bets_p1|bets_p2|p1_cstreak|p2_cstreak|p1_wstreak|p2_wstreak|league_code
+        Legacy debug format — a "|" inside a field shifts everything after it. Use get_room_snapshot.
+        """
         if room_code not in self.room_state:
             return "not_found"
 
@@ -690,6 +792,55 @@ class AnimeTrivialDuel:
         return (f"{state}|{p1}|{p2}|{a1}|{a2}|{p1_bal}|{p2_bal}|{q1}|{q2}|"
                 f"{pu1}|{pu2}|{winner}|{sn1}|{sn2}|{bp1}|{bp2}|{p1_cs}|{p2_cs}|{p1_ws}|{p2_ws}|{lc}")
 
+    @gl.public.view
+    def list_rooms(self, status: str, offset: int, limit: int) -> str:
+        """
+        Page through the room index for "waiting" or "active" rooms.
+        Returns RI1 with header "total" (see file header). limit is capped at 50.
+        """
+        assert status in ("waiting", "active"), "status must be waiting or active"
+        total = self.room_index_count[status] if status in self.room_index_count else 0
+        limit = max(0, min(limit, 50))
+        out   = f"{ROOM_INDEX_VERSION}\n{total}\n"
+        for idx in range(max(offset, 0), min(offset + limit, total)):
+            out += self._room_index_entry(self.room_index_slot[f"{status}|{idx}"])
+        return out
+
+    @gl.public.view
+    def get_room_changes(self, since_seq: int, limit: int) -> str:
+        """
+        Room index changes after since_seq, oldest first.
+        Returns RI1 with header "last_seq|first_seq" (see file header).
+        first_seq is the oldest change still in the log; if since_seq <
+        first_seq - 1 the gap is gone, no records come back and the caller
+        must re-page with list_rooms.
+        limit is capped at 100; follow up from the last returned seq if more remain.
+        """
+        limit = max(0, min(limit, 100))
+        first = max(1, self.room_index_seq - ROOM_INDEX_LOG_SIZE + 1)
+        out   = f"{ROOM_INDEX_VERSION}\n{self.room_index_seq}|{first}\n"
+        seq   = max(since_seq, 0) + 1
+        if seq < first:
+            return out
+        end = min(self.room_index_seq, seq + limit - 1)
+        while seq <= end:
+            entry = self.room_index_log[str(seq % ROOM_INDEX_LOG_SIZE)]
+            room_code, status = entry.rsplit("|", 1)
+            out += f"{seq};" + self._room_index_entry(room_code, status)
+            seq += 1
+        return out
+
+    @gl.public.view
+    def get_room_snapshot(self, room_code: str) -> str:
+        """One room in the RS1 snapshot encoding (see file header)."""
+        return ROOM_SNAPSHOT_VERSION + "\n" + self._room_snapshot(room_code)
+
+    @gl.public.view
+    def get_room_snapshots(self, room_codes: str) -> str:
+        """Comma-separated room codes (max 50) → one RS1 buffer holding a record per room, in order."""
+        codes = [c for c in room_codes.split(",") if c != ""][:50]
+        return ROOM_SNAPSHOT_VERSION + "\n" + "".join(self._room_snapshot(c) for c in codes)
+
     @gl.public.view
     def get_bettor_info(self, room_code: str, bettor_address: str) -> str:
         """Returns: side|amount|claimed  or  none"""
@@ -707,14 +858,45 @@ class AnimeTrivialDuel:
 
     @gl.public.view
     def get_league_info(self, league_code: str) -> str:
-        """Returns: name|creator|member_count|created_at  or  not_found"""
+        """Returns: creator|member_count|created_at|season|season_start|name  or  not_found (name last, may contain "|")"""
         if league_code not in self.league_name:
             return "not_found"
         name    = self.league_name[league_code]
         creator = self.league_creator[league_code]
         count   = self.league_member_count[league_code] if league_code in self.league_member_count else 0
         ts      = self.league_created_at[league_code]   if league_code in self.league_created_at   else 0
-        return f"{name}|{creator}|{count}|{ts}"
+        season  = self.league_season[league_code]       if league_code in self.league_season       else 1
+        start   = self.league_season_start[league_code] if league_code in self.league_season_start else ts
+        return f"{creator}|{count}|{ts}|{season}|{start}|{name}"
+
+    @gl.public.view
+    def list_leagues(self, offset: int, limit: int) -> str:
+        """
+        Page through leagues in creation order.
+        Returns: "total" on the first line, then one
+        "code|creator|member_count|created_at|season|season_start|name" per line
+        (name last, may contain "|").
+        limit is capped at 50.
+        """
+        limit = max(0, min(limit, 50))
+        lines = [str(self.league_count)]
+        for idx in range(max(offset, 0), min(offset + limit, self.league_count)):
+            code    = self.league_index[str(idx)]
+            creator = self.league_creator[code]
+            count   = self.league_member_count[code] if code in self.league_member_count else 0
+            ts      = self.league_created_at[code]   if code in self.league_created_at   else 0
+            season  = self.league_season[code]       if code in self.league_season       else 1
+            start   = self.league_season_start[code] if code in self.league_season_start else ts
+            lines.append(f"{code}|{creator}|{count}|{ts}|{season}|{start}|{self.league_name[code]}")
+        return "\n".join(lines)
+
+    @gl.public.view
+    def get_league_season(self, league_code: str, season: int) -> str:
+        """Returns the frozen standings "addr,wins,losses,tokens,games;..." for a closed season, or not_found."""
+        key = f"{league_code}|{season}"
+        if key not in self.league_season_snapshot:
+            return "not_found"
+        return self.league_season_snapshot[key]
 
     @gl.public.view
     def get_league_member(self, league_code: str, index: int) -> str:
@@ -765,6 +947,122 @@ class AnimeTrivialDuel:
     # INTERNAL HELPERS
     # ══════════════════════════════════════════════════════════════════════════
 
+    def _index_room(self, room_code: str, status: str) -> None:
+        """Move room_code into the status list ("finished" just drops it) and log the change."""
+        if room_code in self.room_index_status and self.room_index_status[room_code] != "":
+            old   = self.room_index_status[room_code]
+            pos   = self.room_index_pos[room_code]
+            last  = self.room_index_count[old] - 1
+            moved = self.room_index_slot[f"{old}|{last}"]
+            # Swap the last entry into the freed slot
+            self.room_index_slot[f"{old}|{pos}"] = moved
+            self.room_index_pos[moved]           = pos
+            del self.room_index_slot[f"{old}|{last}"]
+            self.room_index_count[old]           = last
+            if moved != room_code:
+                self._log_room_index(moved, old)
+
+        if status in ("waiting", "active"):
+            count = self.room_index_count[status] if status in self.room_index_count else 0
+            self.room_index_slot[f"{status}|{count}"] = room_code
+            self.room_index_pos[room_code]            = count
+            self.room_index_count[status]             = count + 1
+            self.room_index_status[room_code]         = status
+        else:
+            self.room_index_status[room_code] = ""
+
+        self._log_room_index(room_code, status)
+
+    def _log_room_index(self, room_code: str, status: str) -> None:
+        self.room_index_seq = self.room_index_seq + 1
+        self.room_index_log[str(self.room_index_seq % ROOM_INDEX_LOG_SIZE)] = f"{room_code}|{status}"
+
+    def _room_index_entry(self, room_code: str, status: str = "") -> str:
+        """One RI1 record body: room_code, status, anime1, anime2 as length-prefixed strings."""
+        strings = [
+            room_code,
+            status or self.room_state[room_code],
+            self.room_anime1[room_code] if room_code in self.room_anime1 else "",
+            self.room_anime2[room_code] if room_code in self.room_anime2 else "",
+        ]
+        return "".join(f"{len(text.encode())}:{text}" for text in strings)
+
+    def _verify_answer(self, question: str, player_answer: str) -> bool:
+        """
+        Grade an answer, reusing a cached verdict for the same normalized
+        (question, answer) pair. Empty answers, which is what the server's
+        auto-miss submits, never reach the LLM.
+        """
+        norm_q = " ".join(question.lower().split())
+        norm_a = " ".join(player_answer.lower().split())
+        if norm_a == "":
+            return False
+
+        key = hashlib.sha256(f"{norm_q}\x00{norm_a}".encode()).hexdigest()
+        if key in self.verdict_cache:
+            return self.verdict_cache[key] == "correct"
+
+        prompt = (
+            f"Anime trivia question: {question}\n"
+            f"Player's answer: {player_answer}\n\n"
+            f"Is the player's answer correct? Be lenient — accept alternate valid answers "
+            f"and minor spelling errors.\n"
+            f"Reply with ONLY the single word 'correct' or 'wrong'."
+        )
+
+        def check():
+            return gl.nondet.exec_prompt(prompt)
+
+        verdict    = gl.eq_principle.strict_eq(check).strip().lower()
+        is_correct = verdict.startswith("correct")
+
+        # Evict whatever held this slot, then store the new verdict
+        slot = str(self.verdict_cache_next)
+        if slot in self.verdict_cache_keys:
+            old = self.verdict_cache_keys[slot]
+            if old in self.verdict_cache:
+                del self.verdict_cache[old]
+        self.verdict_cache_keys[slot] = key
+        self.verdict_cache[key]       = "correct" if is_correct else "wrong"
+        self.verdict_cache_next       = (self.verdict_cache_next + 1) % VERDICT_CACHE_SIZE
+        return is_correct
+
+    def _room_snapshot(self, room_code: str) -> str:
+        if room_code not in self.room_state:
+            ints    = [-1] + [0] * 14
+            strings = [room_code, "", "", "", "", "", ""]
+        else:
+            p1 = self.room_player1[room_code] if room_code in self.room_player1 else ""
+            p2 = self.room_player2[room_code] if room_code in self.room_player2 else ""
+            ints = [
+                ROOM_STATE_CODES[self.room_state[room_code]],
+                self.balances[p1] if p1 in self.balances else 0,
+                self.balances[p2] if p2 in self.balances else 0,
+                self.room_q1_answered[room_code],
+                self.room_q2_answered[room_code],
+                POWERUP_CODES[self.room_p1_powerup[room_code]],
+                POWERUP_CODES[self.room_p2_powerup[room_code]],
+                self.room_p1_snipe_active[room_code],
+                self.room_p2_snipe_active[room_code],
+                self.room_bets_p1[room_code],
+                self.room_bets_p2[room_code],
+                self.room_p1_correct_streak[room_code],
+                self.room_p2_correct_streak[room_code],
+                self.room_p1_wrong_streak[room_code],
+                self.room_p2_wrong_streak[room_code],
+            ]
+            strings = [
+                room_code, p1, p2,
+                self.room_anime1[room_code] if room_code in self.room_anime1 else "",
+                self.room_anime2[room_code] if room_code in self.room_anime2 else "",
+                self.room_winner[room_code],
+                self.room_league[room_code],
+            ]
+        out = ",".join(str(n) for n in ints) + ";"
+        for text in strings:
+            out += f"{len(text.encode())}:{text}"
+        return out
+
     def _next_powerup(self, current: str) -> str:
         """Cycle: "" → shield → snipe → double_down → shield → ..."""
         cycle = {
@@ -0,0 +1,116 @@
+// ── Room snapshot decoder ──────────────────────────────────────────────────
+// Decodes the RS1 encoding returned by the contract's get_room_snapshot /
+// get_room_snapshots (layout documented in the contract.py header):
+//   "RS1\n" + records, each record =
+//     15 comma-separated ints + ";" + 7 × "<utf-8 byte length>:<bytes>"
+// Strings are length-prefixed, so a "|" (or anything else) inside an anime
+// name can't shift the fields after it.
+//
+// Also decodes RI1, the room index encoding of list_rooms / get_room_changes:
+//   "RI1\n" + header line + records, each record =
+//     ["<seq>;"] + 4 × "<utf-8 byte length>:<bytes>"
+
+const VERSION       = "RS1";
+const INDEX_VERSION = "RI1";
+const STATES   = { "-1": "not_found", 0: "waiting", 1: "active", 2: "finished" };
+const POWERUPS = ["", "shield", "snipe", "double_down"];
+
+const INT_FIELDS = [
+  "state", "p1_bal", "p2_bal", "q1", "q2", "pu1", "pu2", "snipe1", "snipe2",
+  "bets_p1", "bets_p2", "p1_cstreak", "p2_cstreak", "p1_wstreak", "p2_wstreak",
+];
+const STRING_FIELDS = ["room_code", "p1", "p2", "anime1", "anime2", "winner", "league_code"];
+const INDEX_FIELDS  = ["room_code", "status", "anime1", "anime2"];
+
+const SEMI  = 0x3b;   // ";"
+const COLON = 0x3a;   // ":"
+
+// Read one "<byte length>:<bytes>" string starting at pos → [text, next pos]
+function readString(buf, pos, name) {
+  const colon = buf.indexOf(COLON, pos);
+  if (colon < 0) throw new Error(`Room snapshot: truncated ${name}`);
+  const len = Number(buf.toString("latin1", pos, colon));
+  return [buf.toString("utf8", colon + 1, colon + 1 + len), colon + 1 + len];
+}
+
+// Split off the "VERSION\n" line → position just after it
+function checkVersion(buf, expected) {
+  const nl      = buf.indexOf(0x0a);
+  const version = buf.toString("latin1", 0, nl < 0 ? buf.length : nl);
+  if (version !== expected) throw new Error(`Unsupported room snapshot version: ${version}`);
+  return nl + 1;
+}
+
+function decodeRecord(buf, pos) {
+  const room = {};
+
+  const intsEnd = buf.indexOf(SEMI, pos);
+  if (intsEnd < 0) throw new Error("Room snapshot: truncated int block");
+  const ints = buf.toString("latin1", pos, intsEnd).split(",");
+  if (ints.length !== INT_FIELDS.length) throw new Error(`Room snapshot: expected ${INT_FIELDS.length} ints, got ${ints.length}`);
+  INT_FIELDS.forEach((name, i) => { room[name] = Number(ints[i]); });
+  pos = intsEnd + 1;
+
+  for (const name of STRING_FIELDS) {
+    [room[name], pos] = readString(buf, pos, name);
+  }
+
+  room.state = STATES[room.state] ?? "not_found";
+  room.pu1   = POWERUPS[room.pu1] ?? "";
+  room.pu2   = POWERUPS[room.pu2] ?? "";
+  return [room, pos];
+}
+
+/**
+ * Decode an RS1 buffer into an array of room objects, in request order.
+ * Rooms missing on-chain come back with state "not_found".
+ */
+export function decodeRoomSnapshots(raw) {
+  const buf = Buffer.from(String(raw), "utf8");
+
+  const rooms = [];
+  let pos = checkVersion(buf, VERSION);
+  while (pos < buf.length) {
+    const [room, next] = decodeRecord(buf, pos);
+    rooms.push(room);
+    pos = next;
+  }
+  return rooms;
+}
+
+/** Decode a single-room RS1 buffer. Returns null if the room doesn't exist. */
+export function decodeRoomSnapshot(raw) {
+  const [room] = decodeRoomSnapshots(raw);
+  return room && room.state !== "not_found" ? room : null;
+}
+
+/**
+ * Decode an RI1 room index page (list_rooms / get_room_changes) into
+ * { header, entries }. header is the raw header line ("total" or
+ * "last_seq|first_seq"); entries are { seq?, room_code, status, anime1, anime2 }.
+ * Pass withSeq for get_room_changes, whose records start with "<seq>;".
+ */
+export function decodeRoomIndex(raw, withSeq = false) {
+  const buf = Buffer.from(String(raw), "utf8");
+  let pos   = checkVersion(buf, INDEX_VERSION);
+  const nl  = buf.indexOf(0x0a, pos);
+  if (nl < 0) throw new Error("Room index: missing header");
+  const header = buf.toString("latin1", pos, nl);
+
+  const entries = [];
+  pos = nl + 1;
+  while (pos < buf.length) {
+    const entry = {};
+    if (withSeq) {
+      const semi = buf.indexOf(SEMI, pos);
+      if (semi < 0) throw new Error("Room index: truncated seq");
+      entry.seq = Number(buf.toString("latin1", pos, semi));
+      pos = semi + 1;
+    }
+    for (const name of INDEX_FIELDS) {
+      [entry[name], pos] = readString(buf, pos, name);
+    }
+    entries.push(entry);
+  }
+  return { header, entries };
+}
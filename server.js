@@ -2,6 +2,8 @@ import "dotenv/config";
 import express from "express";
 import { createClient, createAccount } from "genlayer-js";
 import { studionet } from "genlayer-js/chains";
+import { CLUSTERED, WORKER_SLOT, IS_LEADER, ownsRoom, withLock, sharedMap } from "./shard.js";
+import { decodeRoomSnapshot, decodeRoomSnapshots, decodeRoomIndex } from "./roomcodec.js";
 
 const app  = express();
 const PORT = process.env.PORT || 3000;
@@ -19,18 +21,31 @@ console.log("  ANIME TRIVIA DUEL SERVER");
 console.log("=================================");
 console.log("Contract:", CONTRACT);
 console.log("Wallet:  ", account.address);
+if (CLUSTERED) console.log("Worker:  ", `slot ${WORKER_SLOT}${IS_LEADER ? " (leader)" : ""}`);
 console.log("=================================");
 
 // ── Helpers ────────────────────────────────────────────────────────────────
 
+// In cluster mode prefer codes this worker owns, so follow-up requests for the
+// room are routed back here. Capped: while the local ring doesn't list this
+// worker yet any code will do — the owner rebuilds the room on first request.
+const ROOM_CODE_ATTEMPTS = 64;
 function makeRoomCode() {
-  return Math.random().toString(36).substring(2, 8).toUpperCase();
+  let code;
+  for (let i = 0; i < ROOM_CODE_ATTEMPTS; i++) {
+    code = Math.random().toString(36).substring(2, 8).toUpperCase();
+    if (ownsRoom(code)) break;
+  }
+  return code;
 }
 
 // ── Transaction queue — prevents nonce collisions from concurrent TXs ───────
+// The "tx" lock extends the queue across cluster workers sharing one signer.
+// It's held until the receipt, like the local queue: the next nonce is only
+// safe to fetch once the previous transaction has landed.
 let txQueue = Promise.resolve();
 function enqueue(fn) {
-  const result = txQueue.then(fn);
+  const result = txQueue.then(() => withLock("tx", fn));
   // Chain on a no-throw wrapper so one failure doesn't jam the whole queue
   txQueue = result.catch(() => {});
   return result;
@@ -135,6 +150,11 @@ async function readContract(functionName, args) {
   return String(result);
 }
 
+// Current on-chain room snapshot (see roomcodec.js), or null if not found
+async function readRoom(room_code) {
+  return decodeRoomSnapshot(await readContract("get_room_snapshot", [room_code]));
+}
+
 // ── Question prefetch cache ────────────────────────────────────────────────
 const questionCache = new Map();
 
@@ -164,9 +184,70 @@ function prefetchQuestion(room_code, for_player, question_num, retryCount = 0) {
     return null;
   });
 
+  // Flag settled entries so /api/question can answer a prefetch hit inline
+  promise.then(() => { promise.settled = true; });
   questionCache.set(key, promise);
 }
 
+// ── Async jobs — chain work runs detached, clients poll GET /api/job/:id ────
+const jobs      = new Map();   // job_id → { id, key, status, result, error, ts, onDeliver, finished }
+const jobsByKey = new Map();   // dedupe key → job_id
+const JOB_TTL   = 10 * 60_000; // finished jobs are kept this long for late polls
+
+// Prefixed with the worker slot so the cluster router can send polls back here
+function makeJobId() {
+  return `${WORKER_SLOT}-` + Date.now().toString(36) + Math.random().toString(36).substring(2, 8);
+}
+
+// Returns the existing job for `key` if one is pending or done, so a client
+// retry (or a proxy re-send) never fires a second transaction.
+function submitJob(key, fn) {
+  const existingId = jobsByKey.get(key);
+  if (existingId && jobs.has(existingId)) return jobs.get(existingId);
+
+  const job = { id: makeJobId(), key, status: "pending", result: null, error: null, ts: Date.now(), onDeliver: null, finished: null };
+  jobs.set(job.id, job);
+  jobsByKey.set(key, job.id);
+
+  // finished settles (never rejects) once status leaves "pending"
+  job.finished = Promise.resolve().then(() => fn(job)).then(result => {
+    job.status = "done";
+    job.result = result;
+  }, err => {
+    job.status = "error";
+    job.error  = err.message;
+    // Failed jobs don't block a fresh retry of the same request
+    if (jobsByKey.get(key) === job.id) jobsByKey.delete(key);
+  }).finally(() => { job.ts = Date.now(); });
+
+  return job;
+}
+
+// Runs the job's onDeliver hook the first time its result goes out to a
+// client, so anything timed from "player saw it" starts at the right moment.
+function deliverJob(job) {
+  if (job.status !== "done" || !job.onDeliver) return;
+  const onDeliver = job.onDeliver;
+  job.onDeliver   = null;
+  onDeliver();
+}
+
+function jobView(job) {
+  if (job.status === "done")  return { job_id: job.id, status: "done", ...job.result };
+  if (job.status === "error") return { job_id: job.id, status: "error", error: job.error };
+  return { job_id: job.id, status: "pending" };
+}
+
+// Sweep finished jobs so memory stays bounded
+setInterval(() => {
+  const cutoff = Date.now() - JOB_TTL;
+  for (const [id, job] of jobs) {
+    if (job.status === "pending" || job.ts > cutoff) continue;
+    jobs.delete(id);
+    if (jobsByKey.get(job.key) === id) jobsByKey.delete(job.key);
+  }
+}, 60_000);
+
 // ── Room State (in-memory) ─────────────────────────────────────────────────
 const roomState = new Map();
 // Structure per room:
@@ -181,10 +262,240 @@ const roomState = new Map();
 //   p1_timer: timeout | null,  p2_timer: timeout | null,
 //   p1_last_q: number,         p2_last_q: number,
 //   p1_last_active: number,    p2_last_active: number,
+//   rehydrated_at?: number     ← set when rebuilt from chain by loadRoom
 // }
 
+// Per-room settings that aren't on chain, shared so whichever worker owns a
+// room can rebuild it
+const roomMeta = sharedMap("room_meta");   // room_code → { ai_accuracy }
+
+const CHAIN_STATUS    = { waiting: "waiting", active: "active", finished: "ended" };
+const REHYDRATE_EVERY = 3_000;   // re-check a rebuilt "waiting" room at most this often
+const rehydrating     = new Map();   // room_code → in-flight rebuild
+
+// Room state for a request: the in-memory copy, or — when this process doesn't
+// have one (restart, or ring ownership moved here) — a copy rebuilt from the
+// chain snapshot. In-flight steals, events and pending auto-miss timers are
+// not on chain and don't survive the move.
+async function loadRoom(room_code) {
+  const state = roomState.get(room_code);
+  if (state && !(state.rehydrated_at && state.status === "waiting")) return state;
+  if (state && Date.now() - state.rehydrated_at < REHYDRATE_EVERY) return state;
+
+  if (!rehydrating.has(room_code)) {
+    rehydrating.set(room_code, rehydrateRoom(room_code).finally(() => rehydrating.delete(room_code)));
+  }
+  return rehydrating.get(room_code);
+}
+
+async function rehydrateRoom(room_code) {
+  let room;
+  try {
+    room = await readRoom(room_code);
+  } catch (err) {
+    console.warn(`[rehydrate] Could not read ${room_code}:`, err.message);
+    return roomState.get(room_code) || null;
+  }
+  if (!room) return null;
+
+  const now   = Date.now();
+  const prev  = roomState.get(room_code);
+  const state = prev || {
+    p1_steal:       null,
+    p2_steal:       null,
+    p1_timer:       null,
+    p2_timer:       null,
+    p1_last_active: now,
+    p2_last_active: now,
+    forfeit_reason: false,
+  };
+  Object.assign(state, {
+    p1_address:    room.p1,
+    p1_anime:      room.anime1,
+    p2_address:    room.p2 || null,
+    p2_anime:      room.anime2 || null,
+    status:        CHAIN_STATUS[room.state] || "ended",
+    winner:        room.winner || null,
+    leagueCode:    room.league_code || null,
+    p1_last_q:     room.q1,
+    p2_last_q:     room.q2,
+    p1_answered_q: room.q1,
+    p2_answered_q: room.q2,
+    rehydrated_at: now,
+  });
+  roomState.set(room_code, state);
+  if (!prev) console.log(`[rehydrate] Rebuilt ${room_code} from chain (${state.status}, Q${room.q1}/Q${room.q2})`);
+
+  if (state.status === "active" && state.p2_address === AI_ADDRESS && !aiRooms.has(room_code)) {
+    state.p1_last_active = state.p2_last_active = now;
+    const accuracy = roomMeta.get(room_code)?.ai_accuracy ?? 0.60;
+    runAIPlayer(room_code, accuracy, room.q2 + 1).catch(err =>
+      console.error(`[AI] Fatal error in room ${room_code}:`, err.message)
+    );
+  }
+  return state;
+}
+
+// ── Lobby cache — mirror of the contract's open/active room index ───────────
+// Bootstrapped from list_rooms, then kept current from get_room_changes, so
+// it survives restarts and never holds finished rooms.
+const lobbyCache = sharedMap("lobby");   // room_code → { room_code, status, p1_anime, p2_anime }
+let lobbySeq     = -1;          // last applied change seq (-1 = not bootstrapped)
+let lobbySyncing = false;
+
+// Per-status room lists with swap-remove — same layout as the contract's slot
+// lists — so /api/lobby pages are a slice. Every worker rebuilds this from
+// lobbyCache changes, local or replicated.
+const lobbyOrder = { waiting: [], active: [] };
+const lobbyPos   = new Map();   // room_code → { status, idx }
+
+function lobbyOrderRemove(room_code) {
+  const pos = lobbyPos.get(room_code);
+  if (!pos) return;
+  const list  = lobbyOrder[pos.status];
+  const moved = list.pop();
+  if (moved !== room_code) {
+    list[pos.idx] = moved;
+    lobbyPos.set(moved, pos);
+  }
+  lobbyPos.delete(room_code);
+}
+
+lobbyCache.onChange((op, room_code, room) => {
+  if (op === "clear") {
+    lobbyOrder.waiting = [];
+    lobbyOrder.active  = [];
+    lobbyPos.clear();
+    return;
+  }
+  const pos = lobbyPos.get(room_code);
+  if (op === "set" && pos?.status === room.status) return;   // same list, keep its place
+  lobbyOrderRemove(room_code);
+  if (op === "set") {
+    const list = lobbyOrder[room.status];
+    lobbyPos.set(room_code, { status: room.status, idx: list.length });
+    list.push(room_code);
+  }
+});
+
+function applyLobbyEntry({ room_code, status, anime1, anime2 }) {
+  if (status === "waiting" || status === "active") {
+    const cur = lobbyCache.get(room_code);
+    // Slot moves are logged with unchanged fields — skip the replicated write
+    if (cur && cur.status === status && cur.p1_anime === anime1 && cur.p2_anime === (anime2 || null)) return;
+    lobbyCache.set(room_code, { room_code, status, p1_anime: anime1, p2_anime: anime2 || null });
+  } else {
+    lobbyCache.delete(room_code);
+  }
+}
+
+async function bootstrapLobby() {
+  // Read the head seq first — changes that land while paging are replayed
+  // after. The contract also logs rooms swapped into a freed slot, so a room
+  // that moved behind the pager is picked up by the replay.
+  const head = Number(decodeRoomIndex(await readContract("get_room_changes", [0, 0]), true).header.split("|")[0]);
+  lobbyCache.clear();
+  for (const status of ["waiting", "active"]) {
+    for (let offset = 0; ; offset += 50) {
+      const { header, entries } = decodeRoomIndex(await readContract("list_rooms", [status, offset, 50]));
+      for (const entry of entries) applyLobbyEntry(entry);
+      if (offset + 50 >= Number(header)) break;
+    }
+  }
+  lobbySeq = head;
+  console.log(`[lobby] Bootstrapped ${lobbyCache.size} rooms at seq ${head}`);
+}
+
+async function syncLobby() {
+  if (lobbySyncing) return;
+  lobbySyncing = true;
+  try {
+    if (lobbySeq < 0) await bootstrapLobby();
+    for (;;) {
+      const { header, entries } = decodeRoomIndex(await readContract("get_room_changes", [lobbySeq, 100]), true);
+      const [headStr, firstStr] = header.split("|");
+      if (lobbySeq < Number(firstStr) - 1) {
+        // Fell out of the contract's change window — re-page from list_rooms
+        console.log(`[lobby] seq ${lobbySeq} older than change log (first ${firstStr}) — re-bootstrapping`);
+        await bootstrapLobby();
+        continue;
+      }
+      for (const entry of entries) {
+        applyLobbyEntry(entry);
+        lobbySeq = entry.seq;
+      }
+      if (entries.length === 0 || lobbySeq >= Number(headStr)) break;
+    }
+  } catch (err) {
+    console.warn(`[lobby] Sync failed: ${err.message.slice(0, 80)}`);
+  } finally {
+    lobbySyncing = false;
+  }
+}
+
+if (IS_LEADER) {
+  syncLobby();
+  setInterval(syncLobby, 3_000);
+}
+
 // ── League registry (in-memory mirror for fast /api/leagues) ────────────────
-const leagueRegistry = new Map();
+// Filled from the contract's append-only league index: new leagues are read
+// every minute, and the whole index is re-read every 10 minutes so member
+// counts and season fields of existing leagues don't go stale.
+const leagueRegistry = sharedMap("leagues");        // code → { name, creator, created_at, member_count, season, season_start }
+const leagueOrder    = sharedMap("league_order");   // index → code, same order as the contract's league_index
+const SEASON_SECS    = 7 * 24 * 60 * 60;
+
+async function syncLeagues(fromOffset = leagueOrder.size) {
+  try {
+    for (let offset = fromOffset; ; ) {
+      const [totalStr, ...lines] = (await readContract("list_leagues", [offset, 50])).split("\n");
+      for (const line of lines) {
+        const parts = line.split("|");
+        const [code, creator, member_count, created_at, season, season_start] = parts;
+        leagueRegistry.set(code, {
+          name:         parts.slice(6).join("|"),
+          creator,
+          created_at:   Number(created_at),
+          member_count: Number(member_count),
+          season:       Number(season),
+          season_start: Number(season_start),
+        });
+        if (leagueOrder.get(offset) !== code) leagueOrder.set(offset, code);
+        offset++;
+      }
+      if (lines.length === 0 || offset >= Number(totalStr)) break;
+    }
+  } catch (err) {
+    console.warn(`[leagues] Sync failed: ${err.message.slice(0, 80)}`);
+  }
+}
+
+// Close any league season that has run a full week. After an outage one roll
+// catches up: the contract starts the next season on the current week's
+// boundary.
+async function rollLeagueSeasons() {
+  const now = Math.floor(Date.now() / 1000);
+  for (const [code, info] of leagueRegistry) {
+    if (now < info.season_start + SEASON_SECS) continue;
+    try {
+      await writeAndWait("roll_league_season", [code, now], 120_000);
+      // Same boundary arithmetic as the contract
+      const next = info.season_start + Math.floor((now - info.season_start) / SEASON_SECS) * SEASON_SECS;
+      leagueRegistry.set(code, { ...info, season: info.season + 1, season_start: next });
+      console.log(`[leagues] ${code} rolled to season ${info.season + 1}`);
+    } catch (err) {
+      console.warn(`[leagues] Season roll failed for ${code}: ${err.message.slice(0, 80)}`);
+    }
+  }
+}
+
+if (IS_LEADER) {
+  syncLeagues().then(rollLeagueSeasons);
+  setInterval(() => syncLeagues(), 60_000);
+  setInterval(() => syncLeagues(0), 10 * 60_000);
+  setInterval(rollLeagueSeasons, 60 * 60_000);
+}
 
 // ── AI Player ──────────────────────────────────────────────────────────────
 const AI_ADDRESS = "0xAb07000000000000000000000000000000000001";
@@ -193,31 +504,47 @@ const AI_ANIMES  = [
   "One Punch Man", "Mob Psycho 100", "Cowboy Bebop",
 ];
 
-async function runAIPlayer(roomCode, accuracy = 0.6) {
-  console.log(`[AI] Starting AI loop for room ${roomCode}`);
+const aiRooms = new Set();   // rooms with an AI loop running in this process
+
+// Runs the AI's side of the game from question `fromQ` on (rebuilt rooms
+// resume mid-game). Stops as soon as this worker no longer owns the room, so
+// a stand-in's loop ends when the room's original worker is back.
+async function runAIPlayer(roomCode, accuracy = 0.6, fromQ = 1) {
+  if (aiRooms.has(roomCode)) return;
+  aiRooms.add(roomCode);
+  try {
+    await aiLoop(roomCode, accuracy, fromQ);
+  } finally {
+    aiRooms.delete(roomCode);
+  }
+}
+
+async function aiLoop(roomCode, accuracy, fromQ) {
+  console.log(`[AI] Starting AI loop for room ${roomCode} at Q${fromQ}`);
   const sleep = ms => new Promise(r => setTimeout(r, ms));
+  const playing = s => s && s.status === "active" && ownsRoom(roomCode);
 
-  for (let qNum = 1; qNum <= 40; qNum++) {
+  for (let qNum = fromQ; qNum <= 40; qNum++) {
     const state = roomState.get(roomCode);
-    if (!state || state.status !== "active") break;
+    if (!playing(state)) break;
 
     // Sync gate: wait for P1 to finish the previous question before AI proceeds
     // This keeps both players on the same question number at all times
     for (let wait = 0; wait < 120; wait++) {
       const s = roomState.get(roomCode);
-      if (!s || s.status !== "active") break;
+      if (!playing(s)) break;
       if ((s.p1_answered_q || 0) >= qNum - 1) break;
       await sleep(3000);
     }
 
     const stateCheck = roomState.get(roomCode);
-    if (!stateCheck || stateCheck.status !== "active") break;
+    if (!playing(stateCheck)) break;
 
     // Simulate thinking time: 20–45 seconds (realistic human-ish pace)
     await sleep(20000 + Math.random() * 25000);
 
     const state2 = roomState.get(roomCode);
-    if (!state2 || state2.status !== "active") break;
+    if (!playing(state2)) break;
 
     try {
       const key = `${roomCode}-p2-${qNum}`;
@@ -293,7 +620,7 @@ async function runAIPlayer(roomCode, accuracy = 0.6) {
 // ── Auto-miss helper ───────────────────────────────────────────────────────
 async function autoMiss(roomCode, player, qNum) {
   const state = roomState.get(roomCode);
-  if (!state || state.status !== "active") return;
+  if (!state || state.status !== "active" || !ownsRoom(roomCode)) return;
   if (state[`${player}_last_q`] !== qNum) return; // player already moved on
 
   // Mark this question as auto-missed so the real answer (if it arrives late) is ignored
@@ -361,16 +688,11 @@ async function triggerForfeit(roomCode, winnerRole) {
 
     // Contract likely rejected because game already ended on-chain — check and sync
     try {
-      const raw = await readContract("get_room_info", [roomCode]);
-      if (raw && raw !== "not_found") {
-        const parts = raw.split("|");
-        const chainStatus = parts[0];
-        const chainWinner = parts[11];
-        if (chainStatus === "finished") {
-          state.status = "ended";
-          state.winner = chainWinner || state.winner;
-          console.log(`[forfeit] Room ${roomCode} already finished on-chain — synced.`);
-        }
+      const room = await readRoom(roomCode);
+      if (room && room.state === "finished") {
+        state.status = "ended";
+        state.winner = room.winner || state.winner;
+        console.log(`[forfeit] Room ${roomCode} already finished on-chain — synced.`);
       }
     } catch {}
 
@@ -388,6 +710,14 @@ setInterval(() => {
   const TIMEOUT = 90_000; // 90s silence = rage quit
 
   for (const [code, state] of roomState) {
+    // Ownership moved back to another worker — drop our stale copy so it
+    // can't forfeit a game that's being played over there
+    if (!ownsRoom(code)) {
+      clearTimeout(state.p1_timer);
+      clearTimeout(state.p2_timer);
+      roomState.delete(code);
+      continue;
+    }
     if (state.status !== "active") continue;
     if (state.p2_address === AI_ADDRESS) continue; // AI games never forfeit
     const p1Dead = (now - (state.p1_last_active || now)) > TIMEOUT;
@@ -464,6 +794,7 @@ app.post("/api/create-room-ai", async (req, res) => {
 
     // Step 1: create room — must wait so the room exists before join_room fires
     await writeAndWait("create_room", [room_code, anime, player_address, ""]);
+    roomMeta.set(room_code, { ai_accuracy: accuracy });
 
     // Set state as "waiting" — flips to "active" once join_room confirms in background
     roomState.set(room_code, {
@@ -544,7 +875,7 @@ app.post("/api/join-room", async (req, res) => {
     return res.status(400).json({ error: "Missing fields" });
   }
 
-  const state = roomState.get(room_code);
+  const state = await loadRoom(room_code);
   if (!state) return res.status(404).json({ error: "Room not found. Check the code and try again." });
   if (state.status !== "waiting") return res.status(400).json({ error: "This room has already started." });
 
@@ -578,7 +909,7 @@ app.post("/api/join-room", async (req, res) => {
  */
 app.get("/api/poll/:code/:player", async (req, res) => {
   const { code, player } = req.params;
-  const state = roomState.get(code);
+  const state = await loadRoom(code);
 
   if (!state) return res.status(404).json({ error: "Room not found" });
 
@@ -602,26 +933,12 @@ app.get("/api/poll/:code/:player", async (req, res) => {
   };
 
   try {
-    const raw = await readContract("get_room_info", [code]);
-    if (raw && raw !== "not_found") {
-      const parts = raw.split("|");
-      const [roomStatus, p1, p2, anime1, anime2, p1_bal, p2_bal, q1, q2,
-             pu1, pu2, winner, snipe1, snipe2, bets_p1, bets_p2,
-             p1_cs, p2_cs, p1_ws, p2_ws, league_code_chain] = parts;
-      cd = {
-        roomStatus, p1, p2, anime1, anime2,
-        p1_bal: Number(p1_bal), p2_bal: Number(p2_bal),
-        q1: Number(q1), q2: Number(q2),
-        pu1, pu2, winner,
-        snipe1: Number(snipe1||0), snipe2: Number(snipe2||0),
-        bets_p1: Number(bets_p1||0), bets_p2: Number(bets_p2||0),
-        p1_cstreak: Number(p1_cs||0), p2_cstreak: Number(p2_cs||0),
-        p1_wstreak: Number(p1_ws||0), p2_wstreak: Number(p2_ws||0),
-        league_code_chain: league_code_chain || "",
-      };
+    const room = await readRoom(code);
+    if (room) {
+      cd = { ...room, roomStatus: room.state };
       // Sync leagueCode from chain into memory (survives server restart)
-      if (state && !state.leagueCode && cd.league_code_chain) {
-        state.leagueCode = cd.league_code_chain;
+      if (state && !state.leagueCode && room.league_code) {
+        state.leagueCode = room.league_code;
       }
     }
   } catch (err) {
@@ -661,35 +978,37 @@ app.get("/api/poll/:code/:player", async (req, res) => {
 /**
  * POST /api/question
  * Body: { room_code, for_player, question_num }
- * Sets server-side auto-miss timer (15s).
+ * Returns { job_id, status } at once — poll GET /api/job/:id for the question.
+ * Sets server-side auto-miss timer once the question is ready.
  */
 app.post("/api/question", async (req, res) => {
-  res.setTimeout(300_000);
-
   const { room_code, for_player, question_num } = req.body;
   if (!room_code || !for_player || !question_num) {
     return res.status(400).json({ error: "Missing fields" });
   }
 
-  try {
-    const qNum  = Number(question_num);
-    const key   = `${room_code}-${for_player}-${qNum}`;
-    const state = roomState.get(room_code);
-
-    // ── Sync gate: both players advance together question by question ─────────
-    // Don't give Q(n) until the opponent has answered Q(n-1).
-    // Skipped for AI games — AI has built-in chain delay so gating would stack
-    // wait times and feel broken (20-45s AI delay + 30-120s chain × 40 questions).
-    const isAIGame = state && state.p2_address === AI_ADDRESS;
-    if (qNum > 1 && state && !isAIGame) {
-      const oppRole     = for_player === "p1" ? "p2" : "p1";
-      const oppAnswered = state[`${oppRole}_answered_q`] || 0;
-      if (oppAnswered < qNum - 1) {
-        console.log(`[question] ${for_player} wants Q${qNum} but opp at Q${oppAnswered} — gating`);
-        return res.json({ waiting: true, opp_q: oppAnswered, your_q: qNum });
-      }
+  const qNum  = Number(question_num);
+  const key   = `${room_code}-${for_player}-${qNum}`;
+  const state = await loadRoom(room_code);
+
+  // ── Sync gate: both players advance together question by question ─────────
+  // Don't give Q(n) until the opponent has answered Q(n-1).
+  // Skipped for AI games — AI has built-in chain delay so gating would stack
+  // wait times and feel broken (20-45s AI delay + 30-120s chain × 40 questions).
+  const isAIGame = state && state.p2_address === AI_ADDRESS;
+  if (qNum > 1 && state && !isAIGame) {
+    const oppRole     = for_player === "p1" ? "p2" : "p1";
+    const oppAnswered = state[`${oppRole}_answered_q`] || 0;
+    if (oppAnswered < qNum - 1) {
+      console.log(`[question] ${for_player} wants Q${qNum} but opp at Q${oppAnswered} — gating`);
+      return res.json({ waiting: true, opp_q: oppAnswered, your_q: qNum });
     }
+  }
 
+  // A finished prefetch is answered in this response instead of via a poll
+  const prefetched = questionCache.get(key)?.settled === true;
+
+  const job = submitJob(`question|${key}`, async job => {
     if (!questionCache.has(key)) {
       console.log(`[question] Cache miss for ${for_player} Q${qNum} — fetching now`);
       prefetchQuestion(room_code, for_player, qNum);
@@ -702,14 +1021,16 @@ app.post("/api/question", async (req, res) => {
 
     if (!parsed) throw new Error("Failed to generate question — please try again");
 
-    // ── Set auto-miss timer ────────────────────────────────────────────────
+    // ── Set auto-miss timer — once the player actually receives the question ──
     if (state) {
-      clearTimeout(state[`${for_player}_timer`]);
-      state[`${for_player}_last_q`]      = qNum;
-      state[`${for_player}_last_active`] = Date.now();
-      state[`${for_player}_timer`]       = setTimeout(
-        () => autoMiss(room_code, for_player, qNum), 120_000
-      );
+      job.onDeliver = () => {
+        clearTimeout(state[`${for_player}_timer`]);
+        state[`${for_player}_last_q`]      = qNum;
+        state[`${for_player}_last_active`] = Date.now();
+        state[`${for_player}_timer`]       = setTimeout(
+          () => autoMiss(room_code, for_player, qNum), 120_000
+        );
+      };
     }
 
     // Prefetch next 2 questions — gives more buffer time against chain slowness
@@ -717,27 +1038,27 @@ app.post("/api/question", async (req, res) => {
     prefetchQuestion(room_code, for_player, qNum + 1);
     prefetchQuestion(room_code, for_player, qNum + 2);
 
-    res.json({ question: parsed });
-  } catch (err) {
-    console.error("Question error:", err.message);
-    res.status(500).json({ error: err.message });
-  }
+    return { question: parsed };
+  });
+
+  if (prefetched && job.status === "pending") await job.finished;
+  deliverJob(job);
+  res.status(job.status === "pending" ? 202 : 200).json(jobView(job));
 });
 
 /**
  * POST /api/answer
  * Body: { room_code, question, player_answer, is_steal, player_address, player_role, question_num }
- * Optimistic: clears timer immediately, fires contract in background.
+ * Optimistic: clears timer immediately, fires contract as a job and returns
+ * { job_id, status } at once — poll GET /api/job/:id for the verdict.
  */
 app.post("/api/answer", async (req, res) => {
-  res.setTimeout(300_000);
-
   const { room_code, question, player_answer, is_steal, player_address, player_role, question_num } = req.body;
-  if (!room_code || !question || !player_address) {
+  if (!room_code || !question || !player_address || !question_num) {
     return res.status(400).json({ error: "Missing fields" });
   }
 
-  const state = roomState.get(room_code);
+  const state = await loadRoom(room_code);
 
   // Clear auto-miss timer immediately
   if (state && player_role) {
@@ -750,64 +1071,83 @@ app.post("/api/answer", async (req, res) => {
     const missed = state[`${player_role}_automissed`];
     if (missed && missed.has(Number(question_num))) {
       console.log(`[answer] Skipping late answer for ${player_role} Q${question_num} — already auto-missed`);
-      return res.json({ result: "wrong" }); // treat as wrong, don't re-submit to chain
+      return res.json({ status: "done", result: "wrong" }); // treat as wrong, don't re-submit to chain
     }
   }
 
-  try {
-    const { result } = await writeAndWait(
-      "submit_answer",
-      [room_code, question, player_answer || "", Boolean(is_steal), player_address],
-      150_000  // 2.5 min cap — Studionet rarely needs more; if it does, treat as miss
-    );
+  // One job per (room, player, question, steal) — resubmits get the same job back
+  const jobKey = `answer|${room_code}|${player_address}|${Number(question_num)}|${is_steal ? "steal" : "normal"}`;
 
-    if (state) {
-      const opponentRole = player_role === "p1" ? "p2" : "p1";
-      const oppStealKey  = `${opponentRole}_steal`;
+  const job = submitJob(jobKey, async () => {
+    try {
+      const { result } = await writeAndWait(
+        "submit_answer",
+        [room_code, question, player_answer || "", Boolean(is_steal), player_address],
+        150_000  // 2.5 min cap — Studionet rarely needs more; if it does, treat as miss
+      );
 
-      // Track answered question for sync gate (normal answers only, not steals)
-      if (!is_steal && player_role && question_num) {
-        const qn = Number(question_num);
-        if (qn > (state[`${player_role}_answered_q`] || 0)) {
-          state[`${player_role}_answered_q`] = qn;
+      if (state) {
+        const opponentRole = player_role === "p1" ? "p2" : "p1";
+        const oppStealKey  = `${opponentRole}_steal`;
+
+        // Track answered question for sync gate (normal answers only, not steals)
+        if (!is_steal && player_role && question_num) {
+          const qn = Number(question_num);
+          if (qn > (state[`${player_role}_answered_q`] || 0)) {
+            state[`${player_role}_answered_q`] = qn;
+          }
         }
-      }
 
-      // Wrong answer on a regular question → give opponent a steal
-      if (!is_steal && (result === "wrong" || result === "wrong_burn")) {
-        if (!state[oppStealKey]) {
-          let questionObj = null;
-          try { questionObj = typeof question === "string" ? JSON.parse(question) : question; } catch {}
-          state[oppStealKey] = { question: questionObj, question_num: Number(question_num) };
-          console.log(`[answer] ${player_role} wrong on Q${question_num} — steal queued for ${opponentRole}`);
+        // Wrong answer on a regular question → give opponent a steal
+        if (!is_steal && (result === "wrong" || result === "wrong_burn")) {
+          if (!state[oppStealKey]) {
+            let questionObj = null;
+            try { questionObj = typeof question === "string" ? JSON.parse(question) : question; } catch {}
+            state[oppStealKey] = { question: questionObj, question_num: Number(question_num) };
+            console.log(`[answer] ${player_role} wrong on Q${question_num} — steal queued for ${opponentRole}`);
+          }
         }
-      }
 
-      // After a steal attempt, clear the steal state
-      if (is_steal) {
-        state[`${player_role}_steal`] = null;
-        console.log(`[answer] ${player_role} steal cleared`);
-      }
+        // After a steal attempt, clear the steal state
+        if (is_steal) {
+          state[`${player_role}_steal`] = null;
+          console.log(`[answer] ${player_role} steal cleared`);
+        }
 
-      state.events = state.events || [];
-      state.events.push({ type: result, player: player_role, qNum: Number(question_num||0), ts: Date.now() });
-      if (state.events.length > 30) state.events.shift();
-    }
+        state.events = state.events || [];
+        state.events.push({ type: result, player: player_role, qNum: Number(question_num||0), ts: Date.now() });
+        if (state.events.length > 30) state.events.shift();
+      }
 
-    res.json({ result });
-  } catch (err) {
-    console.error("Answer error:", err.message);
-    // Chain failed (UNDETERMINED / timeout) — don't crash the game.
-    // Count as answered so sync gate and end-game don't get stuck.
-    if (state && player_role && question_num && !is_steal) {
-      const qn = Number(question_num);
-      if (qn > (state[`${player_role}_answered_q`] || 0)) {
-        state[`${player_role}_answered_q`] = qn;
+      return { result };
+    } catch (err) {
+      console.error("Answer error:", err.message);
+      // Chain failed (UNDETERMINED / timeout) — don't crash the game.
+      // Count as answered so sync gate and end-game don't get stuck.
+      if (state && player_role && question_num && !is_steal) {
+        const qn = Number(question_num);
+        if (qn > (state[`${player_role}_answered_q`] || 0)) {
+          state[`${player_role}_answered_q`] = qn;
+        }
       }
+      // Return wrong so client can show result and advance
+      return { result: "wrong", chain_error: true };
     }
-    // Return wrong so client can show result and advance
-    res.json({ result: "wrong", chain_error: true });
-  }
+  });
+
+  res.status(202).json(jobView(job));
+});
+
+/**
+ * GET /api/job/:id
+ * Status of a job from /api/question or /api/answer:
+ *   { job_id, status: "pending" } | { job_id, status: "done", ...result } | { job_id, status: "error", error }
+ */
+app.get("/api/job/:id", (req, res) => {
+  const job = jobs.get(req.params.id);
+  if (!job) return res.status(404).json({ error: "Job not found or expired" });
+  deliverJob(job);
+  res.json(jobView(job));
 });
 
 /**
@@ -825,15 +1165,10 @@ app.post("/api/end-game", async (req, res) => {
   // ── Pre-check: both players must have answered all 40 questions ───────────
   // Avoids hitting the contract's assert and crashing the client.
   try {
-    const raw = await readContract("get_room_info", [room_code]);
-    if (raw && raw !== "not_found") {
-      const parts = raw.split("|");
-      const q1 = Number(parts[7]);
-      const q2 = Number(parts[8]);
-      if (q1 < 40 || q2 < 40) {
-        console.log(`[end-game] Not ready — q1=${q1}, q2=${q2}`);
-        return res.json({ waiting: true, q1, q2 });
-      }
+    const room = await readRoom(room_code);
+    if (room && (room.q1 < 40 || room.q2 < 40)) {
+      console.log(`[end-game] Not ready — q1=${room.q1}, q2=${room.q2}`);
+      return res.json({ waiting: true, q1: room.q1, q2: room.q2 });
     }
   } catch (checkErr) {
     console.warn("[end-game] Pre-check failed:", checkErr.message.slice(0, 80));
@@ -847,7 +1182,8 @@ app.post("/api/end-game", async (req, res) => {
       120_000
     );
 
-    const state = roomState.get(room_code);
+    const state = await loadRoom(room_code);
+    roomMeta.delete(room_code);
     if (state) {
       state.status = "ended";
       state.winner = result;
@@ -857,15 +1193,12 @@ app.post("/api/end-game", async (req, res) => {
       // (league_code from chain = survives server restart, state.leagueCode is memory-only fallback)
       if (result && result !== "tie") {
         try {
-          const raw = await readContract("get_room_info", [room_code]);
-          if (raw && raw !== "not_found") {
-            const parts           = raw.split("|");
-            const p1_bal          = Number(parts[5]);
-            const p2_bal          = Number(parts[6]);
-            const league_code_chain = parts[20] || "";
+          const room = await readRoom(room_code);
+          if (room) {
+            const { p1_bal, p2_bal } = room;
 
             // Prefer chain value, fall back to in-memory
-            const effectiveLeague = league_code_chain || state.leagueCode || null;
+            const effectiveLeague = room.league_code || state.leagueCode || null;
 
             if (effectiveLeague) {
               const winnerAddr = result.replace("winner:", "");
@@ -901,35 +1234,36 @@ app.post("/api/end-game", async (req, res) => {
 
 /**
  * GET /api/room/:code
- * Raw contract room info (kept for debugging).
+ * Decoded contract room snapshot (kept for debugging).
  */
 app.get("/api/room/:code", async (req, res) => {
   try {
-    const raw = await readContract("get_room_info", [req.params.code]);
-    if (raw === "not_found") return res.json({ found: false });
-
-    const parts = raw.split("|");
-    const [state, p1, p2, anime1, anime2, p1_bal, p2_bal, q1, q2,
-           pu1, pu2, winner, snipe1, snipe2, bets_p1, bets_p2,
-           p1_cs, p2_cs, p1_ws, p2_ws, league_code] = parts;
-    res.json({
-      found: true,
-      state, p1, p2, anime1, anime2,
-      p1_bal: Number(p1_bal), p2_bal: Number(p2_bal),
-      q1: Number(q1), q2: Number(q2),
-      pu1, pu2, winner,
-      snipe1: Number(snipe1||0), snipe2: Number(snipe2||0),
-      bets_p1: Number(bets_p1||0), bets_p2: Number(bets_p2||0),
-      p1_cstreak: Number(p1_cs||0), p2_cstreak: Number(p2_cs||0),
-      p1_wstreak: Number(p1_ws||0), p2_wstreak: Number(p2_ws||0),
-      league_code: league_code || "",
-    });
+    const room = await readRoom(req.params.code);
+    if (!room) return res.json({ found: false });
+    res.json({ found: true, ...room });
   } catch (err) {
     console.error("Room info error:", err.message);
     res.status(500).json({ error: err.message });
   }
 });
 
+/**
+ * GET /api/rooms?codes=ABC123,DEF456
+ * Bulk room snapshots in one contract read (max 50 codes).
+ */
+app.get("/api/rooms", async (req, res) => {
+  const codes = String(req.query.codes || "").split(",").filter(Boolean).slice(0, 50);
+  if (codes.length === 0) return res.json({ rooms: [] });
+
+  try {
+    const rooms = decodeRoomSnapshots(await readContract("get_room_snapshots", [codes.join(",")]));
+    res.json({ rooms: rooms.filter(r => r.state !== "not_found") });
+  } catch (err) {
+    console.error("Rooms error:", err.message);
+    res.status(500).json({ error: err.message });
+  }
+});
+
 /**
  * GET /api/balance/:addr
  */
@@ -954,7 +1288,7 @@ app.post("/api/use-snipe", async (req, res) => {
   try {
     const { result } = await writeAndWait("use_snipe", [room_code, player_address], 120_000);
 
-    const state = roomState.get(room_code);
+    const state = await loadRoom(room_code);
     if (state) {
       const player_role = state.p1_address === player_address ? "p1" : "p2";
       state.events = state.events || [];
@@ -971,21 +1305,21 @@ app.post("/api/use-snipe", async (req, res) => {
 });
 
 /**
- * GET /api/lobby
+ * GET /api/lobby?offset=0&limit=24
+ * Waiting rooms first, then active, sliced from the lobby order lists —
+ * cost is O(limit), not O(all rooms ever).
  */
 app.get("/api/lobby", (req, res) => {
-  const rooms = [];
-  for (const [code, state] of roomState.entries()) {
-    if (state.status !== "ended") {
-      rooms.push({
-        room_code: code,
-        status:    state.status,
-        p1_anime:  state.p1_anime,
-        p2_anime:  state.p2_anime || null,
-      });
-    }
-  }
-  res.json({ rooms });
+  const offset = Math.max(0, Number(req.query.offset) || 0);
+  const limit  = Math.min(100, Math.max(1, Number(req.query.limit) || 24));
+
+  const { waiting, active } = lobbyOrder;
+  const codes = offset < waiting.length
+    ? waiting.slice(offset, offset + limit).concat(active.slice(0, Math.max(0, offset + limit - waiting.length)))
+    : active.slice(offset - waiting.length, offset - waiting.length + limit);
+
+  const rooms = codes.map(code => lobbyCache.get(code));
+  res.json({ rooms, total: waiting.length + active.length, offset, limit });
 });
 
 /**
@@ -993,7 +1327,7 @@ app.get("/api/lobby", (req, res) => {
  */
 app.get("/api/spectate/:code", async (req, res) => {
   const { code } = req.params;
-  const state = roomState.get(code);
+  const state = await loadRoom(code);
   if (!state) return res.status(404).json({ error: "Room not found" });
 
   let cd = {
@@ -1005,20 +1339,8 @@ app.get("/api/spectate/:code", async (req, res) => {
   };
 
   try {
-    const raw = await readContract("get_room_info", [code]);
-    if (raw && raw !== "not_found") {
-      const parts = raw.split("|");
-      const [roomStatus, p1, p2, anime1, anime2, p1_bal, p2_bal, q1, q2,
-             pu1, pu2, winner, snipe1, snipe2, bets_p1, bets_p2] = parts;
-      cd = {
-        roomStatus, p1, p2, anime1, anime2,
-        p1_bal: Number(p1_bal), p2_bal: Number(p2_bal),
-        q1: Number(q1), q2: Number(q2),
-        pu1, pu2, winner,
-        snipe1: Number(snipe1||0), snipe2: Number(snipe2||0),
-        bets_p1: Number(bets_p1||0), bets_p2: Number(bets_p2||0),
-      };
-    }
+    const room = await readRoom(code);
+    if (room) cd = { ...room, roomStatus: room.state };
   } catch (err) {
     console.warn(`[spectate] readContract failed: ${err.message.slice(0, 80)}`);
   }
@@ -1126,7 +1448,10 @@ app.post("/api/league/create", async (req, res) => {
     const created_at = Math.floor(Date.now() / 1000);
     await writeAndWait("create_league", [league_code, name, creator_address, created_at], 120_000);
 
-    leagueRegistry.set(league_code, { name, creator: creator_address, created_at, member_count: 1 });
+    leagueRegistry.set(league_code, {
+      name, creator: creator_address, created_at, member_count: 1, season: 1, season_start: created_at,
+    });
+    syncLeagues();   // picks up its place in the league index for /api/leagues
 
     console.log(`[league/create] ${league_code} — ${name}`);
     res.json({ ok: true, league_code });
@@ -1151,7 +1476,7 @@ app.post("/api/league/join", async (req, res) => {
     await writeAndWait("join_league", [league_code, member_address], 120_000);
 
     const reg = leagueRegistry.get(league_code);
-    if (reg) reg.member_count = (reg.member_count || 0) + 1;
+    if (reg) leagueRegistry.set(league_code, { ...reg, member_count: (reg.member_count || 0) + 1 });
 
     console.log(`[league/join] ${member_address} joined ${league_code}`);
     res.json({ ok: true });
@@ -1172,9 +1497,12 @@ app.get("/api/league/:code", async (req, res) => {
     const infoRaw = await readContract("get_league_info", [code]);
     if (infoRaw === "not_found") return res.status(404).json({ error: "League not found" });
 
-    const [name, creator, member_count_str, created_at_str] = infoRaw.split("|");
+    const [creator, member_count_str, created_at_str, season_str, season_start_str, ...nameParts] = infoRaw.split("|");
+    const name         = nameParts.join("|");
     const member_count = Number(member_count_str);
     const created_at   = Number(created_at_str);
+    const season       = Number(season_str || 1);
+    const season_start = Number(season_start_str || created_at);
 
     // Fetch all members in parallel
     const memberPromises = [];
@@ -1205,7 +1533,7 @@ app.get("/api/league/:code", async (req, res) => {
     // Sort: wins desc, then tokens_earned desc
     standings.sort((a, b) => b.wins - a.wins || b.tokens_earned - a.tokens_earned);
 
-    res.json({ name, creator, member_count, created_at, standings });
+    res.json({ name, creator, member_count, created_at, season, season_start, standings });
   } catch (err) {
     console.error("League info error:", err.message);
     res.status(500).json({ error: err.message });
@@ -1213,15 +1541,51 @@ app.get("/api/league/:code", async (req, res) => {
 });
 
 /**
- * GET /api/leagues
- * Returns all leagues from in-memory registry.
+ * GET /api/league/:code/season/:season
+ * Frozen standings for a closed season.
+ */
+app.get("/api/league/:code/season/:season", async (req, res) => {
+  const { code, season } = req.params;
+
+  try {
+    const raw = await readContract("get_league_season", [code, Number(season)]);
+    if (raw === "not_found") return res.status(404).json({ error: "Season not found" });
+
+    const standings = (raw ? raw.split(";") : []).map(row => {
+      const [address, wins, losses, tokens_earned, games] = row.split(",");
+      return {
+        address,
+        short_addr:    address.slice(0, 6) + "…" + address.slice(-4),
+        wins:          Number(wins),
+        losses:        Number(losses),
+        tokens_earned: Number(tokens_earned),
+        games:         Number(games),
+      };
+    });
+    standings.sort((a, b) => b.wins - a.wins || b.tokens_earned - a.tokens_earned);
+
+    res.json({ league_code: code, season: Number(season), standings });
+  } catch (err) {
+    console.error("League season error:", err.message);
+    res.status(500).json({ error: err.message });
+  }
+});
+
+/**
+ * GET /api/leagues?offset=0&limit=50
+ * Returns a page of leagues in on-chain index (creation) order — O(limit).
  */
 app.get("/api/leagues", (req, res) => {
+  const offset = Math.max(0, Number(req.query.offset) || 0);
+  const limit  = Math.min(100, Math.max(1, Number(req.query.limit) || 50));
+  const total  = leagueOrder.size;
+
   const leagues = [];
-  for (const [code, info] of leagueRegistry.entries()) {
-    leagues.push({ league_code: code, ...info });
+  for (let i = offset; i < Math.min(offset + limit, total); i++) {
+    const code = leagueOrder.get(i);
+    leagues.push({ league_code: code, ...leagueRegistry.get(code) });
   }
-  res.json({ leagues });
+  res.json({ leagues, total, offset, limit });
 });
 
 // ── Start ──────────────────────────────────────────────────────────────────
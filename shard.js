@@ -0,0 +1,164 @@
+// ── Room sharding helpers ──────────────────────────────────────────────────
+// Shared by cluster.js (primary) and server.js (workers).
+// Outside cluster mode every helper falls back to plain in-process behaviour,
+// so `node server.js` works exactly as a single process.
+import cluster from "node:cluster";
+import { createHash } from "node:crypto";
+
+// ── Consistent hash ring ───────────────────────────────────────────────────
+// Each worker slot owns `replicas` points on a 32-bit ring; a room belongs to
+// the first point at or after hash(room_code). Removing a slot only moves the
+// rooms that slot owned.
+export class HashRing {
+  constructor(replicas = 64) {
+    this.replicas = replicas;
+    this.members  = new Set();
+    this.points   = [];   // [{ hash, member }] sorted by hash
+  }
+
+  static hash(key) {
+    return createHash("md5").update(String(key)).digest().readUInt32BE(0);
+  }
+
+  setMembers(members) {
+    this.members = new Set(members);
+    this.points  = [];
+    for (const member of this.members) {
+      for (let i = 0; i < this.replicas; i++) {
+        this.points.push({ hash: HashRing.hash(`${member}#${i}`), member });
+      }
+    }
+    this.points.sort((a, b) => a.hash - b.hash);
+  }
+
+  add(member)    { this.setMembers([...this.members, member]); }
+  remove(member) { this.setMembers([...this.members].filter(m => m !== member)); }
+
+  owner(key) {
+    if (this.points.length === 0) return null;
+    const h = HashRing.hash(key);
+    let lo = 0, hi = this.points.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (this.points[mid].hash < h) lo = mid + 1;
+      else hi = mid;
+    }
+    return this.points[lo % this.points.length].member;
+  }
+}
+
+// ── Worker identity ────────────────────────────────────────────────────────
+export const CLUSTERED   = cluster.isWorker;
+export const WORKER_SLOT = Number(process.env.WORKER_SLOT || 0);
+// Slot 0 runs the chain-sync duties (lobby index, league registry, season
+// rollover) so they happen once, not once per worker.
+export const IS_LEADER   = WORKER_SLOT === 0;
+
+const ring = new HashRing();
+ring.add(WORKER_SLOT);
+
+export function ownsRoom(room_code) {
+  return ring.owner(room_code) === WORKER_SLOT;
+}
+
+// ── Cross-process lock (primary grants in FIFO order) ──────────────────────
+let lockSeq = 0;
+const lockWaiters = new Map();   // request id → resolve
+
+export async function withLock(name, fn) {
+  if (!CLUSTERED) return fn();
+
+  const id = `${WORKER_SLOT}:${++lockSeq}`;
+  await new Promise(resolve => {
+    lockWaiters.set(id, resolve);
+    process.send({ type: "lock", name, id });
+  });
+  try {
+    return await fn();
+  } finally {
+    process.send({ type: "unlock", name, id });
+  }
+}
+
+// ── Replicated maps ────────────────────────────────────────────────────────
+// A Map whose set/delete/clear are mirrored to every worker via the primary.
+// Values must be plain, structured-cloneable data — replace entries with
+// set() instead of mutating them in place, or the change won't propagate.
+// onChange(fn) listeners see every change, local or replicated, as
+// fn("set", key, value) / fn("delete", key) / fn("clear").
+const sharedMaps = new Map();   // name → SharedMap
+
+class SharedMap extends Map {
+  constructor(name) {
+    super();
+    this.name      = name;
+    this.listeners = [];
+  }
+
+  onChange(fn) {
+    this.listeners.push(fn);
+  }
+
+  // Apply without echoing back to the primary — used for replicated changes
+  applySet(key, value) {
+    super.set(key, value);
+    for (const fn of this.listeners) fn("set", key, value);
+  }
+
+  applyDelete(key) {
+    const had = super.delete(key);
+    if (had) for (const fn of this.listeners) fn("delete", key);
+    return had;
+  }
+
+  applyClear() {
+    super.clear();
+    for (const fn of this.listeners) fn("clear");
+  }
+
+  set(key, value) {
+    this.applySet(key, value);
+    if (CLUSTERED) process.send({ type: "map_set", name: this.name, key, value });
+    return this;
+  }
+
+  delete(key) {
+    const had = this.applyDelete(key);
+    if (CLUSTERED && had) process.send({ type: "map_delete", name: this.name, key });
+    return had;
+  }
+
+  clear() {
+    this.applyClear();
+    if (CLUSTERED) process.send({ type: "map_clear", name: this.name });
+  }
+}
+
+export function sharedMap(name) {
+  if (!sharedMaps.has(name)) sharedMaps.set(name, new SharedMap(name));
+  return sharedMaps.get(name);
+}
+
+// ── Messages from the primary ──────────────────────────────────────────────
+if (CLUSTERED) {
+  process.on("message", msg => {
+    if (msg.type === "ring") {
+      ring.setMembers(msg.members);
+    } else if (msg.type === "lock_granted") {
+      const resolve = lockWaiters.get(msg.id);
+      lockWaiters.delete(msg.id);
+      if (resolve) resolve();
+    } else if (msg.type === "map_snapshot") {
+      const map = sharedMap(msg.name);
+      map.applyClear();
+      for (const [k, v] of msg.entries) map.applySet(k, v);
+    } else if (msg.type === "map_set") {
+      sharedMap(msg.name).applySet(msg.key, msg.value);
+    } else if (msg.type === "map_delete") {
+      sharedMap(msg.name).applyDelete(msg.key);
+    } else if (msg.type === "map_clear") {
+      sharedMap(msg.name).applyClear();
+    }
+  });
+  process.send({ type: "hello" });
+}